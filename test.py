@@ -4,17 +4,78 @@ Simplified test suite for Async NoStd HTTP Server
 Tests with up to 8 workers, faster execution
 """
 
+import asyncio
+import atexit
+import base64
+import collections
+import concurrent.futures
+import contextvars
+import functools
+import hashlib
+import json
+import re
 import subprocess
 import time
+import errno
+import select
+import shutil
 import socket
 import sys
 import signal
 import os
+import threading
+from dataclasses import dataclass, field
 
-# Global output buffer
-OUTPUT_BUFFER = []
-FAILED_TESTS = []  # Only failed test outputs
+# Global output: streamed to TEST_LOG_FILE as JSONL {"l": level, "m": msg}
+# records, recent records kept for console display on build failure
+LOG_FH = None  # Opened in main()
+LOG_TAIL = collections.deque(maxlen=200)
+LOG_LOCK = threading.Lock()
 TEST_LOG_FILE = "/tmp/test_all_output.log"
+SERVER_BINARY = "./target/x86_64-unknown-none/release/async-nostd"
+# Files whose changes require a rebuild (html/ is embedded via include_bytes!):
+# (directory, name suffixes) scanned recursively, plus top-level files
+BUILD_INPUTS = [("src", (".rs",)), ("crates", (".rs", "Cargo.toml")), ("html", ("",)),
+                (".cargo", ("config.toml",))]
+BUILD_INPUT_FILES = ["Cargo.toml", "Cargo.lock"]
+CLIENT_SOCK_BUF = 65536  # SO_SNDBUF/SO_RCVBUF and recv size for test client sockets
+VERBOSE = os.environ.get("TEST_VERBOSE") == "1"  # Per-request progress lines
+WS_PIPELINE_DEPTH = 8  # WebSocket stress messages in flight per batch
+MAX_PARALLEL_SERVERS = 8  # Cap on servers running at once (port/fd pressure)
+PARALLEL = os.environ.get("TEST_PARALLEL", "")  # Overlap at least this many servers
+# Every server truncates and writes the same SERVER_LOG_FILE, so it is only
+# readable when servers run one at a time
+SERVER_LOG_FILE = "/tmp/async-nostd.log"
+SERIAL = os.environ.get("TEST_SERIAL") == "1"
+# Optional taskset-style CPU list (e.g. "2-7") to pin servers to; the test
+# client is then kept on the remaining cores
+SERVER_CPUS = os.environ.get("TEST_SERVER_CPUS")
+TASKSET = shutil.which("taskset") if SERVER_CPUS else None  # Servers pinned only if found
+
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"  # RFC 6455 handshake GUID
+WS_OPCODE_CONTINUATION = 0x0
+WS_OPCODE_TEXT = 0x1
+WS_OPCODE_CLOSE = 0x8
+WS_OPCODE_PING = 0x9
+
+# Response validators, matched against raw response bytes
+HTTP_OK_RE = re.compile(rb'HTTP/1\.[01] 200 OK')
+HTML_RE = re.compile(rb'<!doctype html>|<html>', re.I)
+
+REALTIME_GET_REQUEST = b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n"
+
+# Shared client thread pool for the thread-based browser tests; sized so
+# every parallel test can hold its connections open at once
+CLIENT_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=MAX_PARALLEL_SERVERS * 5, thread_name_prefix="testclient")
+atexit.register(CLIENT_EXECUTOR.shutdown, wait=False)
+
+LIVE_PGIDS = set()  # Process groups of running test servers (pid == pgid)
+LIVE_PGIDS_LOCK = threading.Lock()  # Orders server spawns against kill_live_servers
+SHUTTING_DOWN = threading.Event()  # Set once servers are killed; no new spawns
+
+# Per-test output buffer, set while a test runs on a pool thread
+LOG_BUFFER = contextvars.ContextVar("LOG_BUFFER", default=None)
 
 class Colors:
     GREEN = '\033[92m'
@@ -23,259 +84,497 @@ class Colors:
     BLUE = '\033[94m'
     RESET = '\033[0m'
 
-def log_output(msg):
-    """Buffer output instead of printing immediately"""
-    OUTPUT_BUFFER.append(msg)
+def write_log_records(records):
+    """Append (level, msg) records to the test log file and the in-memory tail"""
+    with LOG_LOCK:
+        for level, msg in records:
+            if LOG_FH is not None:
+                LOG_FH.write(json.dumps({"l": level, "m": msg}, separators=(",", ":")))
+                LOG_FH.write('\n')
+            LOG_TAIL.append((level, msg))
+
+def log_output(msg, level="log"):
+    """Log output instead of printing immediately"""
+    buffer = LOG_BUFFER.get()
+    if buffer is None:
+        write_log_records(((level, msg),))
+    else:
+        buffer.append((level, msg))
 
 def print_success(msg):
-    log_output(f"{Colors.GREEN}✓{Colors.RESET} {msg}")
+    log_output(msg, "ok")
 
 def print_error(msg):
-    log_output(f"{Colors.RED}✗{Colors.RESET} {msg}")
+    log_output(msg, "error")
 
 def print_info(msg):
-    log_output(f"{Colors.BLUE}ℹ{Colors.RESET} {msg}")
+    log_output(msg, "info")
 
 def print_section(msg):
-    log_output(f"\n{Colors.YELLOW}{'='*60}{Colors.RESET}")
-    log_output(f"{Colors.YELLOW}{msg}{Colors.RESET}")
-    log_output(f"{Colors.YELLOW}{'='*60}{Colors.RESET}\n")
+    log_output(msg, "section")
+
+def format_console(level, msg):
+    """Render a log record for the terminal, re-adding colors"""
+    if level == "ok":
+        return f"{Colors.GREEN}✓{Colors.RESET} {msg}"
+    if level == "error":
+        return f"{Colors.RED}✗{Colors.RESET} {msg}"
+    if level == "info":
+        return f"{Colors.BLUE}ℹ{Colors.RESET} {msg}"
+    if level == "warn":
+        return f"{Colors.YELLOW}{msg}{Colors.RESET}"
+    if level == "section":
+        bar = f"{Colors.YELLOW}{'='*60}{Colors.RESET}"
+        return f"\n{bar}\n{Colors.YELLOW}{msg}{Colors.RESET}\n{bar}\n"
+    return msg
+
+def kill_live_servers():
+    """SIGKILL every server process group we started, then reap them.
+
+    Returns the number of servers that were still running.
+    """
+    with LIVE_PGIDS_LOCK:
+        SHUTTING_DOWN.set()  # Tests still winding down must not spawn more
+        pgids = list(LIVE_PGIDS)
+        for pgid in pgids:
+            try:
+                os.killpg(pgid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+    deadline = time.monotonic() + 0.1
+    pending = set(pgids)
+    while pending and time.monotonic() < deadline:
+        for pid in list(pending):
+            try:
+                if os.waitpid(pid, os.WNOHANG)[0] == 0:
+                    continue
+            except ChildProcessError:
+                pass
+            pending.discard(pid)
+        if pending:
+            time.sleep(0.005)
+    LIVE_PGIDS.difference_update(pgids)
+    return len(pgids)
 
 class AsyncServer:
     def __init__(self, workers, port):
         self.workers = workers
         self.port = port
         self.process = None
-        self.log_file = f"/tmp/test-server-{port}.log"
+        self.pgid = None
         
     def start(self):
         """Start the async server"""
-        binary = "./target/x86_64-unknown-none/release/async-nostd"
-        cmd = [binary, str(self.workers), "127.0.0.1", str(self.port)]
+        cmd = [SERVER_BINARY, str(self.workers), "127.0.0.1", str(self.port)]
+        if TASKSET:
+            # taskset execs the server, so worker threads inherit the mask
+            # and the pid stays the session leader
+            cmd = [TASKSET, "-c", SERVER_CPUS] + cmd
         
         log_output(f"    Starting server: workers={self.workers}, port={self.port}")
         
-        # Open log file for server output (suppress console output)
-        with open(self.log_file, 'w') as log:
+        with LIVE_PGIDS_LOCK:
+            if SHUTTING_DOWN.is_set():
+                raise RuntimeError("Test run interrupted, not starting another server")
+            # The server logs to SERVER_LOG_FILE and writes nothing to stdio
             self.process = subprocess.Popen(
                 cmd,
-                stdout=subprocess.DEVNULL,  # Suppress stdout (minimal console output)
-                stderr=log,                  # Redirect stderr to log
-                preexec_fn=os.setsid
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True
             )
+            self.pgid = self.process.pid  # Session leader, so pid == pgid
+            LIVE_PGIDS.add(self.pgid)
         
-        # Wait for server to be ready
+        # Wait for server to be ready: retry a non-blocking connect on one
+        # probe socket, with exponential backoff
         max_wait = 3
-        for i in range(max_wait * 10):
-            time.sleep(0.1)
-            try:
-                test_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                test_sock.settimeout(0.1)
-                test_sock.connect(("127.0.0.1", self.port))
-                test_sock.close()
-                time.sleep(0.1)
-                log_output(f"    Server ready after {(i+1)*0.1:.1f}s")
-                return
-            except:
-                pass
+        delay = 0.001
+        started = time.monotonic()
+        test_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_sock.setblocking(False)
+        try:
+            while time.monotonic() - started < max_wait:
+                err = test_sock.connect_ex(("127.0.0.1", self.port))
+                if err in (0, errno.EISCONN):
+                    log_output(f"    Server ready after {time.monotonic() - started:.3f}s")
+                    return
+                if err in (errno.EINPROGRESS, errno.EALREADY):
+                    select.select([], [test_sock], [], delay)
+                else:
+                    time.sleep(delay)
+                delay = min(delay * 2, 0.05)
+        finally:
+            test_sock.close()
         print_error(f"Server failed to start on port {self.port} after {max_wait}s")
         
     def stop(self):
         """Stop the server"""
         if self.process:
             try:
-                os.killpg(os.getpgid(self.process.pid), signal.SIGKILL)
-            except:
-                pass
-            self.process.wait()
+                os.killpg(self.pgid, signal.SIGTERM)
+                try:
+                    self.process.wait(timeout=0.5)
+                except subprocess.TimeoutExpired:
+                    os.killpg(self.pgid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass  # Already exited
+            try:
+                self.process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                print_error(f"Server pid {self.process.pid} still running after SIGKILL")
+            LIVE_PGIDS.discard(self.pgid)
             self.process = None
     
-    def get_log(self):
-        """Read server log file"""
-        try:
-            with open(self.log_file, 'r') as f:
-                return f.read()
-        except:
-            return ""
-    
-    def check_log(self, pattern):
-        """Check if pattern exists in log"""
-        log = self.get_log()
-        return pattern in log
-
     def __enter__(self):
         self.start()
         return self
         
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.stop()
-        # Cleanup log file
-        try:
-            os.remove(self.log_file)
-        except:
-            pass
+
+def tune_client_socket(sock):
+    """Disable Nagle and size socket buffers for short request/response"""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, CLIENT_SOCK_BUF)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, CLIENT_SOCK_BUF)
+
+@functools.lru_cache(maxsize=16)
+def build_get_request(path):
+    """Encoded GET request for path (cached, path is almost always /)"""
+    return f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode("ascii")
 
 def http_get(port, path="/", timeout=3):
-    """Perform HTTP GET request"""
+    """Perform HTTP GET request, returning the raw response bytes
+
+    One connection per request: the server closes the fd after every
+    response (no keep-alive), so connections cannot be pooled.
+    """
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        sock.connect(("127.0.0.1", port))
-        
-        request = f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n"
-        sock.sendall(request.encode())
-        
-        response = b""
-        while True:
-            chunk = sock.recv(4096)
-            if not chunk:
-                break
-            response += chunk
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            tune_client_socket(sock)
+            sock.settimeout(timeout)
+            sock.connect(("127.0.0.1", port))
+            
+            # Cork so the request leaves as one segment; quick-ACK the response
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+            sock.sendall(build_get_request(path))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+            
+            # Receive in place into a buffer that doubles when full
+            buf = bytearray(CLIENT_SOCK_BUF)
+            off = 0
+            while True:
+                if off == len(buf):
+                    buf.extend(bytes(len(buf)))
+                n = sock.recv_into(memoryview(buf)[off:])
+                if not n:
+                    break
+                off += n
+            
+            return bytes(buf[:off])
+    except OSError:
+        return None
+
+async def http_get_async(port, path="/", timeout=3):
+    """Perform HTTP GET request on the running asyncio event loop"""
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection("127.0.0.1", port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    try:
+        writer.write(build_get_request(path))
+        await writer.drain()
         
-        sock.close()
-        return response.decode('utf-8', errors='ignore')
-    except Exception as e:
+        response = await asyncio.wait_for(reader.read(), timeout)
+        return response
+    except (OSError, asyncio.TimeoutError):
         return None
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass  # Reset by the server while closing
+
+class WebSocketClient:
+    """Minimal stdlib RFC 6455 client: handshake, masked text frames, frame reads"""
+    
+    def __init__(self, port, path, timeout=3):
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+        self.buf = bytearray()  # Received bytes not yet consumed
+        try:
+            tune_client_socket(self.sock)
+            self.handshake(port, path)
+        except BaseException:
+            self.sock.close()
+            raise
+    
+    def handshake(self, port, path):
+        """Send the upgrade request and verify the 101 response"""
+        key = base64.b64encode(os.urandom(16))
+        self.sock.sendall(
+            f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+            f"Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key.decode('ascii')}\r\n"
+            f"Sec-WebSocket-Version: 13\r\n\r\n".encode("ascii"))
+        status, *lines = self.read_until(b"\r\n\r\n").split(b"\r\n")
+        # Header names are case-insensitive (RFC 7230 3.2)
+        headers = {}
+        for line in lines:
+            name, sep, value = line.partition(b":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        accept = base64.b64encode(hashlib.sha1(key + WS_GUID).digest())
+        if status.split(b" ")[1:2] != [b"101"] or headers.get(b"sec-websocket-accept") != accept:
+            raise ConnectionError(f"WebSocket handshake failed: {status!r}")
+    
+    def fill(self):
+        """Append the next recv() to buf"""
+        chunk = self.sock.recv(CLIENT_SOCK_BUF)
+        if not chunk:
+            raise ConnectionError("WebSocket closed by server")
+        self.buf += chunk
+    
+    def read_until(self, delim):
+        """Consume and return bytes up to and including delim"""
+        while (end := self.buf.find(delim)) < 0:
+            self.fill()
+        end += len(delim)
+        data = bytes(self.buf[:end])
+        del self.buf[:end]
+        return data
+    
+    def read_exact(self, n):
+        """Consume and return exactly n bytes"""
+        while len(self.buf) < n:
+            self.fill()
+        data = bytes(self.buf[:n])
+        del self.buf[:n]
+        return data
+    
+    def send_frame(self, opcode, payload):
+        """Send one final frame, masked as RFC 6455 requires of clients"""
+        n = len(payload)
+        if n < 126:
+            header = bytes([0x80 | opcode, 0x80 | n])
+        elif n < 65536:
+            header = bytes([0x80 | opcode, 0x80 | 126]) + n.to_bytes(2, "big")
+        else:
+            header = bytes([0x80 | opcode, 0x80 | 127]) + n.to_bytes(8, "big")
+        mask = os.urandom(4)
+        # XOR the whole payload at once as one big integer
+        key = (mask * (n // 4 + 1))[:n]
+        masked = (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(n, "big")
+        self.sock.sendall(header + mask + masked)
+    
+    def send(self, text):
+        """Send text as a single text frame"""
+        self.send_frame(WS_OPCODE_TEXT, text.encode())
+    
+    def recv_frame(self):
+        """Read one (unmasked) server frame, returning (fin, opcode, payload)"""
+        b0, b1 = self.read_exact(2)
+        length = b1 & 0x7f
+        if length == 126:
+            length = int.from_bytes(self.read_exact(2), "big")
+        elif length == 127:
+            length = int.from_bytes(self.read_exact(8), "big")
+        return bool(b0 & 0x80), b0 & 0x0f, self.read_exact(length)
+    
+    def recv_data(self):
+        """Read the next data message, returning (opcode, payload).
+
+        Frames are read by their header length, so each echo maps to one
+        message, which the pipelined stress batches rely on. A fragmented
+        message is joined from its continuation frames. The server follows
+        every echo with a ping; it ignores pongs, so none is sent. A close
+        frame raises ConnectionError.
+        """
+        data_opcode, data = None, bytearray()
+        while True:
+            fin, opcode, payload = self.recv_frame()
+            if opcode == WS_OPCODE_PING:
+                continue
+            if opcode == WS_OPCODE_CLOSE:
+                raise ConnectionError("WebSocket closed by server")
+            # Continuation frames are valid only inside a fragmented message
+            if (opcode == WS_OPCODE_CONTINUATION) != (data_opcode is not None):
+                raise ConnectionError(f"Unexpected WebSocket opcode {opcode:#x}")
+            if data_opcode is None:
+                if fin:
+                    return opcode, payload  # Unfragmented, the common case
+                data_opcode = opcode
+            data += payload
+            if fin:
+                return data_opcode, bytes(data)
+    
+    def close(self):
+        """Send a close frame and drop the connection"""
+        try:
+            self.send_frame(WS_OPCODE_CLOSE, b"")
+        except OSError:
+            pass  # Server already gone
+        self.sock.close()
 
 def test_http_basic(port):
     """Test basic HTTP GET request"""
     log_output(f"      Making HTTP request to port {port}...")
     response = http_get(port)
-    if response and "200 OK" in response and ("<!doctype html>" in response or "<html>" in response):
+    if response and HTTP_OK_RE.search(response) and HTML_RE.search(response):
         log_output(f"      Got valid response ({len(response)} bytes)")
         return True, len(response)
     log_output(f"      Failed: response={'None' if not response else f'{len(response)} bytes'}")
     return False, 0
 
 def test_http_concurrent(port, num_requests=5):
-    """Test concurrent HTTP requests"""
-    import concurrent.futures
-    
+    """Test concurrent HTTP requests (all sockets driven by one event loop)"""
     log_output(f"      Testing {num_requests} concurrent requests...")
-    def make_request(i):
-        time.sleep(0.02 * i)
-        response = http_get(port, timeout=5)
-        success = response is not None and "200 OK" in response
-        log_output(f"        Request {i+1}: {'OK' if success else 'FAILED'}")
+    async def make_request(i):
+        response = await http_get_async(port, timeout=5)
+        success = response is not None and HTTP_OK_RE.search(response) is not None
+        if VERBOSE:
+            log_output(f"        Request {i+1}: {'OK' if success else 'FAILED'}")
         return success
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_requests) as executor:
-        futures = [executor.submit(make_request, i) for i in range(num_requests)]
-        results = [f.result() for f in concurrent.futures.as_completed(futures)]
+    async def run_requests():
+        return await asyncio.gather(*[make_request(i) for i in range(num_requests)])
+    
+    results = asyncio.run(run_requests())
     
     success = sum(results)
     log_output(f"      Concurrent: {success}/{num_requests} succeeded")
     return success, num_requests
 
-def test_http_stress(port, num_requests=10):
-    """Stress test with multiple sequential requests"""
-    log_output(f"      Stress test: {num_requests} sequential requests...")
+def test_http_stress(port, num_requests=10, max_in_flight=5):
+    """Stress test with many requests, at most max_in_flight at a time"""
+    log_output(f"      Stress test: {num_requests} requests ({max_in_flight} in flight)...")
+    done = 0
     success = 0
-    for i in range(num_requests):
-        response = http_get(port, timeout=2)
-        if response and "200 OK" in response:
+    async def make_request(limit):
+        nonlocal done, success
+        async with limit:
+            # New connection per request: the server closes after each response
+            response = await http_get_async(port, timeout=2)
+        done += 1
+        if response and HTTP_OK_RE.search(response):
             success += 1
-        if (i + 1) % 5 == 0:
-            log_output(f"        Progress: {success}/{i+1}")
+        if VERBOSE and done % 5 == 0:
+            log_output(f"        Progress: {success}/{done}")
+    
+    async def run_requests():
+        limit = asyncio.Semaphore(max_in_flight)
+        await asyncio.gather(*[make_request(limit) for _ in range(num_requests)])
+    
+    asyncio.run(run_requests())
     log_output(f"      Stress: {success}/{num_requests} succeeded")
     return success, num_requests
 
+def collect_results(futures, max_failures=None):
+    """Gather boolean results, giving up once more than max_failures failed"""
+    results = []
+    for future in concurrent.futures.as_completed(futures):
+        results.append(future.result())
+        if max_failures is not None and results.count(False) > max_failures:
+            # Cancel what has not started, and wait out what has, so no
+            # client outlives the test and talks to a stopped server
+            running = [f for f in futures if not f.cancel()]
+            concurrent.futures.wait(running)
+            break
+    return results
+
 def test_websocket_echo(port):
     """Test WebSocket handshake and echo"""
-    try:
-        import websocket
-    except ImportError:
-        log_output(f"      Skipping: websocket-client not installed (pip install websocket-client)")
-        return None, 0
-    
     log_output(f"      Testing WebSocket on port {port}...")
     try:
-        ws = websocket.create_connection(f"ws://127.0.0.1:{port}/term", timeout=3)
-        
-        # Read welcome message (binary data)
-        welcome = ws.recv()
-        welcome_str = welcome.decode('utf-8') if isinstance(welcome, bytes) else welcome
-        if welcome_str and "Async NoStd" in welcome_str:
-            log_output(f"        Welcome message received ({len(welcome)} bytes)")
-        
-        # Test echo
-        test_msg = "Hello WebSocket!"
-        ws.send(test_msg)
-        response = ws.recv()
-        response_str = response.decode('utf-8') if isinstance(response, bytes) else response
-        ws.close()
+        ws = WebSocketClient(port, "/term")
+        try:
+            # Read welcome message (binary data)
+            _, welcome = ws.recv_data()
+            if b"Async NoStd" in welcome:
+                log_output(f"        Welcome message received ({len(welcome)} bytes)")
+            
+            # Test echo (server echoes the payload back in a binary frame)
+            test_msg = "Hello WebSocket!"
+            ws.send(test_msg)
+            _, response = ws.recv_data()
+        finally:
+            ws.close()
         
-        if test_msg in response_str:
+        if response == test_msg.encode():
             log_output(f"        Echo test passed")
             return True, 1
         else:
-            log_output(f"        Echo failed: sent '{test_msg}', got '{response_str}'")
+            log_output(f"        Echo failed: sent '{test_msg}', got {response!r}")
             return False, 0
     except Exception as e:
         log_output(f"        WebSocket test failed: {e}")
         return False, 0
 
-def test_websocket_concurrent(port, num_connections=5):
-    """Test concurrent WebSocket connections"""
-    try:
-        import websocket
-    except ImportError:
-        log_output(f"      Skipping: websocket-client not installed")
-        return None, 0
-    
-    import concurrent.futures
-    
+def test_websocket_concurrent(port, num_connections=5, max_failures=None):
+    """Test concurrent WebSocket connections (stop early past max_failures)"""
     log_output(f"      Testing {num_connections} concurrent WebSocket connections...")
+    barrier = threading.Barrier(num_connections)
     
     def ws_echo_test(i):
+        # Deliberately a fresh connection each: concurrent handshakes are what
+        # this test exercises, so connections are not pooled
         try:
-            ws = websocket.create_connection(f"ws://127.0.0.1:{port}/term", timeout=3)
-            welcome = ws.recv()  # Read welcome
-            test_msg = f"Test {i+1}"
-            ws.send(test_msg)
-            response = ws.recv()
-            response_str = response.decode('utf-8') if isinstance(response, bytes) else response
-            ws.close()
-            success = test_msg in response_str
+            barrier.wait(timeout=5)  # Release all handshakes at the same instant
+        except threading.BrokenBarrierError:
+            pass  # A client never arrived; connect anyway
+        try:
+            ws = WebSocketClient(port, "/term")
+            try:
+                ws.recv_data()  # Read welcome
+                test_msg = f"Test {i+1}"
+                ws.send(test_msg)
+                _, response = ws.recv_data()
+            finally:
+                ws.close()
+            success = response == test_msg.encode()
             log_output(f"        Connection {i+1}: {'OK' if success else 'FAILED'}")
             return success
         except Exception as e:
             log_output(f"        Connection {i+1}: FAILED ({e})")
             return False
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_connections) as executor:
-        futures = [executor.submit(ws_echo_test, i) for i in range(num_connections)]
-        results = [f.result() for f in concurrent.futures.as_completed(futures)]
+    # A dedicated pool gives every barrier party its own thread; on the
+    # shared CLIENT_EXECUTOR they could wait behind other tests' clients
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_connections) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, ws_echo_test, i)
+                   for i in range(num_connections)]
+        results = collect_results(futures, max_failures)
     
     success = sum(results)
     log_output(f"      Concurrent WS: {success}/{num_connections} succeeded")
     return success, num_connections
 
 def test_websocket_stress(port, num_messages=20):
-    """Stress test WebSocket with multiple messages on single connection"""
-    try:
-        import websocket
-    except ImportError:
-        log_output(f"      Skipping: websocket-client not installed")
-        return None, 0
-    
+    """Stress test WebSocket with pipelined messages on single connection"""
     log_output(f"      WebSocket stress test: {num_messages} messages...")
     try:
-        ws = websocket.create_connection(f"ws://127.0.0.1:{port}/term", timeout=3)
-        welcome = ws.recv()  # Read welcome
-        
-        success = 0
-        for i in range(num_messages):
-            test_msg = f"Message {i+1}"
-            ws.send(test_msg)
-            response = ws.recv()
-            response_str = response.decode('utf-8') if isinstance(response, bytes) else response
-            if test_msg in response_str:
-                success += 1
-            if (i + 1) % 10 == 0:
-                log_output(f"        Progress: {success}/{i+1}")
-        
-        ws.close()
+        ws = WebSocketClient(port, "/term")
+        try:
+            ws.recv_data()  # Read welcome
+            
+            # Pipeline: send a batch, then read the echoes back in order
+            success = 0
+            for start in range(0, num_messages, WS_PIPELINE_DEPTH):
+                end = min(start + WS_PIPELINE_DEPTH, num_messages)
+                batch = [f"Message {i+1}" for i in range(start, end)]
+                for test_msg in batch:
+                    ws.send(test_msg)
+                for test_msg in batch:
+                    _, response = ws.recv_data()
+                    if response == test_msg.encode():
+                        success += 1
+                if VERBOSE:
+                    log_output(f"        Progress: {success}/{end}")
+        finally:
+            ws.close()
         log_output(f"      WS Stress: {success}/{num_messages} succeeded")
         return success, num_messages
     except Exception as e:
@@ -284,76 +583,64 @@ def test_websocket_stress(port, num_messages=20):
 
 def test_browser_simulation(port, hold_time=2):
     """Simulate browser: GET index, open WebSocket, hold connection, close"""
-    try:
-        import websocket
-    except ImportError:
-        log_output(f"      Skipping: websocket-client not installed")
-        return None, 0
-    
     log_output(f"      Browser simulation: GET + WebSocket (hold {hold_time}s)...")
     try:
         # 1. GET index page (like browser does)
         response = http_get(port, timeout=3)
-        if not response or "200 OK" not in response:
+        if not response or not HTTP_OK_RE.search(response):
             log_output(f"        Failed to GET index page")
             return False, 0
         log_output(f"        GET / -> 200 OK")
         
         # 2. Open WebSocket connection
-        ws = websocket.create_connection(f"ws://127.0.0.1:{port}/ws", timeout=3)
-        welcome = ws.recv()
-        log_output(f"        WebSocket connected, holding for {hold_time}s...")
-        
-        # 3. Hold connection open (simulate user viewing page)
-        time.sleep(hold_time)
-        
-        # 4. Send a message to verify it's still alive
-        ws.send("ping")
-        response = ws.recv()
-        log_output(f"        Connection still alive after {hold_time}s")
-        
-        # 5. Close cleanly
-        ws.close()
+        ws = WebSocketClient(port, "/ws")
+        try:
+            ws.recv_data()  # Read welcome
+            log_output(f"        WebSocket connected, holding for {hold_time}s...")
+            
+            # 3. Hold connection open (simulate user viewing page)
+            time.sleep(hold_time)
+            
+            # 4. Send a message to verify it's still alive
+            ws.send("ping")
+            ws.recv_data()
+            log_output(f"        Connection still alive after {hold_time}s")
+        finally:
+            # 5. Close cleanly
+            ws.close()
         log_output(f"        Browser simulation complete")
         return True, 1
     except Exception as e:
         log_output(f"        Browser simulation failed: {e}")
         return False, 0
 
-def test_multiple_browsers(port, num_browsers=3, hold_time=2):
-    """Simulate multiple browsers connecting simultaneously"""
-    try:
-        import websocket
-    except ImportError:
-        log_output(f"      Skipping: websocket-client not installed")
-        return None, 0
-    
-    import concurrent.futures
-    
+def test_multiple_browsers(port, num_browsers=3, hold_time=2, max_failures=None):
+    """Simulate multiple browsers connecting simultaneously (stop early past max_failures)"""
     log_output(f"      Multiple browsers: {num_browsers} simultaneous connections...")
     
     def browser_session(browser_id):
         try:
             # GET index
             response = http_get(port, timeout=3)
-            if not response or "200 OK" not in response:
+            if not response or not HTTP_OK_RE.search(response):
                 log_output(f"        Browser {browser_id}: Failed GET")
                 return False
             
             # Open WebSocket
-            ws = websocket.create_connection(f"ws://127.0.0.1:{port}/ws", timeout=3)
-            welcome = ws.recv()
-            log_output(f"        Browser {browser_id}: Connected")
-            
-            # Hold connection
-            time.sleep(hold_time)
-            
-            # Test alive
-            ws.send(f"Browser {browser_id} ping")
-            response = ws.recv()
-            
-            # Close
-            ws.close()
+            ws = WebSocketClient(port, "/ws")
+            try:
+                ws.recv_data()  # Read welcome
+                log_output(f"        Browser {browser_id}: Connected")
+                
+                # Hold connection
+                time.sleep(hold_time)
+                
+                # Test alive
+                ws.send(f"Browser {browser_id} ping")
+                ws.recv_data()
+            finally:
+                # Close
+                ws.close()
             log_output(f"        Browser {browser_id}: Closed cleanly")
             return True
         except Exception as e:
@@ -361,54 +648,48 @@ def test_multiple_browsers(port, num_browsers=3, hold_time=2):
             return False
     
     # Run all browser sessions in parallel
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_browsers) as executor:
-        futures = [executor.submit(browser_session, i+1) for i in range(num_browsers)]
-        results = [f.result() for f in concurrent.futures.as_completed(futures)]
+    futures = [CLIENT_EXECUTOR.submit(contextvars.copy_context().run, browser_session, i+1)
+               for i in range(num_browsers)]
+    results = collect_results(futures, max_failures)
     
     success = sum(results)
     log_output(f"      Multiple browsers: {success}/{num_browsers} succeeded")
     return success, num_browsers
 
 
-def test_realtime_log_monitoring(port, num_requests=5, delay=0.5):
+def test_realtime_log_monitoring(port, num_requests=5):
     """Test with real-time log monitoring - simulates multiple browser requests"""
-    try:
-        import websocket
-    except ImportError:
-        log_output(f"{Colors.YELLOW}      websocket-client not installed, skipping{Colors.RESET}")
-        return None, 0
-    
     log_output(f"      Real-time test: {num_requests} requests with log monitoring...")
-    log_output(f"      Monitor server log: tail -f /tmp/async-nostd.log")
+    if SERIAL:
+        log_output(f"      Monitor server log: tail -f {SERVER_LOG_FILE}")
     
     success = 0
     for i in range(num_requests):
         try:
             # HTTP request
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            tune_client_socket(sock)
             sock.settimeout(3)
             sock.connect(("127.0.0.1", port))
-            sock.sendall(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            sock.sendall(REALTIME_GET_REQUEST)
             response = sock.recv(4096)
             sock.close()
             
-            if b"200 OK" in response:
+            if HTTP_OK_RE.search(response):
                 log_output(f"        Request {i+1}: HTTP OK")
                 success += 1
             else:
                 log_output(f"        Request {i+1}: HTTP Failed")
             
-            time.sleep(delay)
-            
             # WebSocket request
-            ws = websocket.create_connection(f"ws://127.0.0.1:{port}/ws", timeout=3)
-            welcome = ws.recv()
-            ws.send(f"Request {i+1} test")
-            response = ws.recv()
-            ws.close()
+            ws = WebSocketClient(port, "/ws")
+            try:
+                ws.recv_data()  # Read welcome
+                ws.send(f"Request {i+1} test")
+                ws.recv_data()
+            finally:
+                ws.close()
             log_output(f"        Request {i+1}: WebSocket OK")
-            
-            time.sleep(delay)
         except Exception as e:
             log_output(f"        Request {i+1}: FAILED ({e})")
     
@@ -416,178 +697,193 @@ def test_realtime_log_monitoring(port, num_requests=5, delay=0.5):
     return success, num_requests
 
 
+def check_http_basic(port):
+    success, response_len = test_http_basic(port)
+    if success:
+        return True, f"Response received ({response_len} bytes)"
+    return False, "Failed to get valid response"
+
+def check_http_concurrent(port):
+    success, num_total = test_http_concurrent(port, 5)
+    if success >= 4:
+        return True, f"Completed {success}/{num_total} concurrent requests"
+    return False, f"Only {success}/{num_total} succeeded"
+
+def check_http_stress(port):
+    success, num_total = test_http_stress(port, 10)
+    if success >= 8:
+        return True, f"Completed {success}/{num_total} requests"
+    return False, f"Only {success}/{num_total} succeeded"
+
+def check_websocket_echo(port):
+    result, count = test_websocket_echo(port)
+    if result:
+        return True, "WebSocket working"
+    return False, "WebSocket test failed"
+
+def check_websocket_concurrent(port):
+    result, count = test_websocket_concurrent(port, 5, max_failures=1)
+    if result and result >= 4:
+        return True, f"Concurrent WS: {result}/{count} succeeded"
+    return False, f"Only {result}/{count} succeeded"
+
+def check_websocket_stress(port):
+    result, count = test_websocket_stress(port, 20)
+    if result and result >= 18:
+        return True, f"WS Stress: {result}/{count} succeeded"
+    return False, f"Only {result}/{count} succeeded"
+
+def check_browser_simulation(port):
+    result, count = test_browser_simulation(port, hold_time=2)
+    if result:
+        return True, "Browser simulation passed"
+    return False, "Browser simulation failed"
+
+def check_multiple_browsers(port):
+    result, count = test_multiple_browsers(port, num_browsers=3, hold_time=2, max_failures=1)
+    if result and result >= 2:  # At least 2 out of 3 should succeed
+        return True, f"Multiple browsers: {result}/{count} succeeded"
+    return False, f"Only {result}/{count} browsers succeeded"
+
+def check_realtime_log_monitoring(port):
+    result, count = test_realtime_log_monitoring(port, num_requests=5)
+    if result and result >= 4:  # At least 4 out of 5 should succeed
+        return True, f"Real-time test: {result}/{count} succeeded"
+    return False, f"Only {result}/{count} requests succeeded"
+
+# (label, filters, min_workers, check) - run in this order for each worker count
+TEST_MATRIX = [
+    ("Basic HTTP", ["all", "http"], 2, check_http_basic),
+    ("Concurrent requests", ["all", "concurrent", "http"], 2, check_http_concurrent),
+    ("Stress test", ["all", "stress", "http"], 2, check_http_stress),
+    ("WebSocket", ["all", "ws"], 2, check_websocket_echo),
+    ("Concurrent WebSocket", ["all", "ws", "concurrent"], 4, check_websocket_concurrent),
+    ("WebSocket Stress", ["all", "ws", "stress"], 8, check_websocket_stress),
+    ("Browser Simulation", ["all", "browser"], 4, check_browser_simulation),
+    # Multiple browsers test - THIS IS THE CRITICAL TEST
+    ("Multiple Browsers", ["all", "browser"], 8, check_multiple_browsers),
+    ("Real-time Log Monitoring", ["all", "browser"], 8, check_realtime_log_monitoring),
+]
+
+def pick_free_port():
+    """Let the OS choose a free loopback port for a test server"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+@dataclass
+class TestResult:
+    name: str
+    passed: bool
+    detail: str = ""
+    output: list = field(default_factory=list)  # Buffered (level, msg) log records
+
+def run_single_test(workers, port, test_name, check):
+    """Run one check against a dedicated server, buffering its log lines"""
+    buffer = []
+    LOG_BUFFER.set(buffer)
+    print_info(f"Test: {test_name}")
+    with AsyncServer(workers, port):
+        passed, detail = check(port)
+    if passed:
+        print_success(detail)
+        return TestResult(test_name, True, detail=detail, output=buffer)
+    print_error(detail)
+    return TestResult(test_name, False, detail=detail, output=buffer)
+
 def run_multi_threaded_tests(test_filter="all"):
     """Run tests for multi-threaded mode with optional filtering
     
     test_filter can be: all, http, ws, stress, browser, concurrent
+    
+    Every test gets its own server on a unique port, so tests run in
+    parallel on a thread pool (the work is I/O-bound, so threads suffice
+    and results stay in-process); log output is merged back in the
+    original order. Returns a list of TestResult.
     """
     print_section("Multi-Threaded Mode Tests")
     
-    passed = 0
-    total = 0
-    
     # Test with 2, 4, 8, and 16 workers
-    test_num = 0
+    jobs = []
     for workers in [2, 4, 8, 16]:
-        base_port = 7100 + workers * 100
-        
-        # Basic HTTP test
-        if test_filter in ["all", "http"]:
-            total += 1
-            test_num += 1
-            port = base_port + test_num
-            test_name = f"{workers} workers - Basic HTTP (port {port})"
-            print_info(f"Test: {test_name}")
-            with AsyncServer(workers, port) as server:
-                success, response_len = test_http_basic(port)
-                if success:
-                    print_success(f"Response received ({response_len} bytes)")
-                    passed += 1
-                else:
-                    print_error("Failed to get valid response")
-                    FAILED_TESTS.append(f"✗ {test_name}: Failed to get valid response")
-        
-        # Concurrent HTTP test
-        if test_filter in ["all", "concurrent", "http"]:
-            total += 1
-            test_num += 1
-            port = base_port + test_num
-            test_name = f"{workers} workers - Concurrent requests (port {port})"
-            print_info(f"Test: {test_name}")
-            with AsyncServer(workers, port) as server:
-                success, num_total = test_http_concurrent(port, 5)
-                if success >= 4:
-                    print_success(f"Completed {success}/{num_total} concurrent requests")
-                    passed += 1
-                else:
-                    print_error(f"Only {success}/{num_total} succeeded")
-                    FAILED_TESTS.append(f"✗ {test_name}: Only {success}/{num_total} succeeded")
-        
-        # Stress test
-        if test_filter in ["all", "stress", "http"]:
-            total += 1
-            test_num += 1
-            port = base_port + test_num
-            test_name = f"{workers} workers - Stress test (port {port})"
-            print_info(f"Test: {test_name}")
-            with AsyncServer(workers, port) as server:
-                success, num_total = test_http_stress(port, 10)
-                if success >= 8:
-                    print_success(f"Completed {success}/{num_total} requests")
-                    passed += 1
-                else:
-                    print_error(f"Only {success}/{num_total} succeeded")
-                    FAILED_TESTS.append(f"✗ {test_name}: Only {success}/{num_total} succeeded")
-        
-        # WebSocket basic test
-        if test_filter in ["all", "ws"]:
-            total += 1
-            test_num += 1
-            port = base_port + test_num
-            test_name = f"{workers} workers - WebSocket (port {port})"
-            print_info(f"Test: {test_name}")
-            with AsyncServer(workers, port) as server:
-                result, count = test_websocket_echo(port)
-                if result is None:
-                    total -= 1  # Skip if websocket-client not installed
-                elif result:
-                    print_success(f"WebSocket working")
-                    passed += 1
-                else:
-                    print_error("WebSocket test failed")
-                    FAILED_TESTS.append(f"✗ {test_name}: WebSocket test failed")
-        
-        # WebSocket concurrent test (only for 4+ workers)
-        if workers >= 4 and test_filter in ["all", "ws", "concurrent"]:
-            total += 1
-            test_num += 1
-            port = base_port + test_num
-            test_name = f"{workers} workers - Concurrent WebSocket (port {port})"
-            print_info(f"Test: {test_name}")
-            with AsyncServer(workers, port) as server:
-                result, count = test_websocket_concurrent(port, 5)
-                if result is None:
-                    total -= 1
-                elif result and result >= 4:
-                    print_success(f"Concurrent WS: {result}/{count} succeeded")
-                    passed += 1
-                else:
-                    print_error(f"Only {result}/{count} succeeded")
-                    FAILED_TESTS.append(f"✗ {test_name}: Only {result}/{count} succeeded")
-        
-        # WebSocket stress test (only for 8+ workers)
-        if workers >= 8 and test_filter in ["all", "ws", "stress"]:
-            total += 1
-            test_num += 1
-            port = base_port + test_num
-            test_name = f"{workers} workers - WebSocket Stress (port {port})"
-            print_info(f"Test: {test_name}")
-            with AsyncServer(workers, port) as server:
-                result, count = test_websocket_stress(port, 20)
-                if result is None:
-                    total -= 1
-                elif result and result >= 18:
-                    print_success(f"WS Stress: {result}/{count} succeeded")
-                    passed += 1
-                else:
-                    print_error(f"Only {result}/{count} succeeded")
-                    FAILED_TESTS.append(f"✗ {test_name}: Only {result}/{count} succeeded")
-        
-        # Browser simulation test (only for 4+ workers)
-        if workers >= 4 and test_filter in ["all", "browser"]:
-            total += 1
-            test_num += 1
-            port = base_port + test_num
-            test_name = f"{workers} workers - Browser Simulation (port {port})"
-            print_info(f"Test: {test_name}")
-            with AsyncServer(workers, port) as server:
-                result, count = test_browser_simulation(port, hold_time=2)
-                if result is None:
-                    total -= 1
-                elif result:
-                    print_success(f"Browser simulation passed")
-                    passed += 1
-                else:
-                    print_error("Browser simulation failed")
-                    FAILED_TESTS.append(f"✗ {test_name}: Browser simulation failed")
-        
-        # Multiple browsers test (only for 8+ workers) - THIS IS THE CRITICAL TEST
-        if workers >= 8 and test_filter in ["all", "browser"]:
-            total += 1
-            test_num += 1
-            port = base_port + test_num
-            test_name = f"{workers} workers - Multiple Browsers (port {port})"
-            print_info(f"Test: {test_name}")
-            with AsyncServer(workers, port) as server:
-                result, count = test_multiple_browsers(port, num_browsers=3, hold_time=2)
-                if result is None:
-                    total -= 1
-                elif result and result >= 2:  # At least 2 out of 3 should succeed
-                    print_success(f"Multiple browsers: {result}/{count} succeeded")
-                    passed += 1
-                else:
-                    print_error(f"Only {result}/{count} succeeded")
-                    FAILED_TESTS.append(f"✗ {test_name}: Only {result}/{count} browsers succeeded")
-        
-        # Real-time log monitoring test (only for 8+ workers)
-        if workers >= 8 and test_filter in ["all", "browser"]:
-            total += 1
-            test_num += 1
-            port = base_port + test_num
-            test_name = f"{workers} workers - Real-time Log Monitoring (port {port})"
-            print_info(f"Test: {test_name}")
-            with AsyncServer(workers, port) as server:
-                result, count = test_realtime_log_monitoring(port, num_requests=5, delay=0.3)
-                if result is None:
-                    total -= 1
-                elif result and result >= 4:  # At least 4 out of 5 should succeed
-                    print_success(f"Real-time test: {result}/{count} succeeded")
-                    passed += 1
-                else:
-                    print_error(f"Only {result}/{count} succeeded")
-                    FAILED_TESTS.append(f"✗ {test_name}: Only {result}/{count} requests succeeded")
+        for label, filters, min_workers, check in TEST_MATRIX:
+            if workers < min_workers or test_filter not in filters:
+                continue
+            port = pick_free_port()
+            jobs.append((workers, port, f"{workers} workers - {label} (port {port})", check))
     
-    return passed, total
+    cpus = os.cpu_count() or 1
+    if PARALLEL.isdigit():
+        # Tests mostly wait on sockets and hold timers, so small machines
+        # can opt into overlapping more servers than they have cores
+        cpus = max(cpus, int(PARALLEL))
+    max_parallel = max(1, min(cpus, MAX_PARALLEL_SERVERS, len(jobs)))
+    if SERIAL:
+        max_parallel = 1  # One server at a time keeps SERVER_LOG_FILE readable
+    results = []
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_parallel)
+    try:
+        futures = [executor.submit(run_single_test, *job) for job in jobs]
+        for future in futures:
+            result = future.result()
+            write_log_records(result.output)
+            results.append(result)
+    except BaseException:
+        # Ctrl+C: drop queued tests and kill the running servers now, rather
+        # than letting a blocking shutdown run the rest of the suite first
+        executor.shutdown(wait=False, cancel_futures=True)
+        killed = kill_live_servers()
+        log_output(f"Killed {killed} running server(s)", "warn")
+        raise
+    executor.shutdown()
+    
+    return results
+
+def scan_mtimes(path, suffixes):
+    """Yield mtimes of files under path whose names end with one of suffixes"""
+    try:
+        entries = os.scandir(path)
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_mtimes(entry.path, suffixes)
+            elif entry.name.endswith(suffixes):
+                yield entry.stat().st_mtime
+
+def binary_is_fresh():
+    """True if the server binary is newer than every build input"""
+    try:
+        binary_mtime = os.stat(SERVER_BINARY).st_mtime
+    except OSError:
+        return False
+    found = False
+    mtimes = [scan_mtimes(path, suffixes) for path, suffixes in BUILD_INPUTS]
+    mtimes.append(os.stat(p).st_mtime for p in BUILD_INPUT_FILES if os.path.exists(p))
+    for source in mtimes:
+        for mtime in source:
+            if mtime >= binary_mtime:
+                return False  # Stop at the first newer input
+            found = True
+    return found
+
+def parse_cpu_list(spec):
+    """Parse a taskset-style CPU list such as "0,2-3" into a set of CPU ids
+
+    Raises ValueError describing the first malformed entry.
+    """
+    cpus = set()
+    for part in spec.split(","):
+        low, _, high = part.strip().partition("-")
+        if not low.isdigit() or not (high or low).isdigit():
+            raise ValueError(f"'{part}' is not a CPU id or low-high range")
+        if int(high or low) < int(low):
+            raise ValueError(f"range '{part}' is reversed")
+        cpus.update(range(int(low), int(high or low) + 1))
+    return cpus
 
 def main():
     import sys
@@ -609,126 +905,138 @@ def main():
         print("  concurrent - Run concurrent tests only")
         return 1
     
-    log_output(f"\n{Colors.BLUE}{'#'*60}")
+    client_cpus = None
+    if SERVER_CPUS:
+        try:
+            server_cpus = parse_cpu_list(SERVER_CPUS)
+        except ValueError as e:
+            print(f"{Colors.RED}Invalid TEST_SERVER_CPUS={SERVER_CPUS!r}: {e}{Colors.RESET}")
+            return 1
+        available = os.sched_getaffinity(0)
+        if not server_cpus <= available:
+            print(f"{Colors.RED}Invalid TEST_SERVER_CPUS={SERVER_CPUS!r}: CPUs "
+                  f"{sorted(server_cpus - available)} are not available "
+                  f"(allowed: {sorted(available)}){Colors.RESET}")
+            return 1
+        if TASKSET is None:
+            print(f"{Colors.YELLOW}taskset not found, TEST_SERVER_CPUS ignored: "
+                  f"servers and client are not pinned{Colors.RESET}")
+        else:
+            # Keep the client off the server cores to avoid cache bouncing
+            client_cpus = available - server_cpus
+    
+    global LOG_FH
+    LOG_FH = open(TEST_LOG_FILE, 'w', buffering=1)
+    
+    if client_cpus:
+        os.sched_setaffinity(0, client_cpus)
+        print_info(f"Servers pinned to CPUs {SERVER_CPUS}, client to {sorted(client_cpus)}")
+    
+    log_output(f"{'#'*60}")
     log_output(f"#  Async NoStd - Comprehensive Test Suite")
     log_output(f"#  Testing HTTP Server + WebSocket (up to 16 workers)")
     log_output(f"#  Mode: {test_mode.upper()}")
-    log_output(f"{'#'*60}{Colors.RESET}\n")
-    
-    # Build the project
-    log_output(f"{Colors.BLUE}ℹ{Colors.RESET} Building project...")
-    result = subprocess.run(
-        ["cargo", "+nightly", "build", "--release"],
-        cwd="/home/coder/async",
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.PIPE
-    )
-    
-    if result.returncode != 0:
-        log_output(f"{Colors.RED}✗{Colors.RESET} Build failed!")
-        log_output(result.stderr.decode())
-        # Print immediately on build failure
-        for line in OUTPUT_BUFFER:
-            print(line)
-        return 1
+    log_output(f"{'#'*60}")
     
-    log_output(f"{Colors.GREEN}✓{Colors.RESET} Build completed\n")
-    
-    # Kill any existing servers
-    subprocess.run(["pkill", "-9", "async-nostd"], 
-                   stderr=subprocess.DEVNULL)
-    time.sleep(1)
+    # Build the project (skipped when the binary is newer than every source)
+    if binary_is_fresh():
+        print_success("Binary up to date, skipping build")
+    else:
+        print_info("Building project...")
+        cmd = ["cargo", "+nightly", "build", "--release"]
+        if os.path.exists("Cargo.lock"):
+            cmd += ["--offline", "--frozen"]
+        result = subprocess.run(
+            cmd,
+            cwd="/home/coder/async",
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+        
+        if result.returncode != 0:
+            print_error("Build failed!")
+            log_output(result.stderr.decode())
+            # Print immediately on build failure
+            sys.stdout.write(''.join(format_console(level, msg) + '\n' for level, msg in LOG_TAIL))
+            return 1
+        
+        print_success("Build completed")
     
     # Run tests
-    total_passed = 0
-    total_tests = 0
+    results = []
     
     if test_mode in ["all", "multi"]:
         # All multi-threaded tests
-        passed, total = run_multi_threaded_tests("all")
-        total_passed += passed
-        total_tests += total
+        results += run_multi_threaded_tests("all")
     elif test_mode in ["http", "ws", "stress", "browser", "concurrent"]:
         # Filtered tests
-        passed, total = run_multi_threaded_tests(test_mode)
-        total_passed += passed
-        total_tests += total
+        results += run_multi_threaded_tests(test_mode)
+    
+    failed_tests = [r for r in results if not r.passed]
+    total_tests = len(results)
+    total_passed = total_tests - len(failed_tests)
     
     # Summary
     print_section("Test Summary")
     success_rate = (total_passed / total_tests * 100) if total_tests > 0 else 0
     log_output(f"Total tests: {total_tests}")
-    log_output(f"Passed: {Colors.GREEN}{total_passed}{Colors.RESET}")
-    log_output(f"Failed: {Colors.RED}{total_tests - total_passed}{Colors.RESET}")
+    log_output(f"Passed: {total_passed}")
+    log_output(f"Failed: {total_tests - total_passed}")
     log_output(f"Success rate: {success_rate:.1f}%")
     
-    # Show test logs summary if there were failures
-    if total_tests - total_passed > 0:
-        log_output(f"\n{Colors.YELLOW}Test Logs (failed tests):{Colors.RESET}")
-        # Find most recent test log with errors
-        import glob
-        log_files = sorted(glob.glob("/tmp/test-server-*.log"), 
-                          key=os.path.getmtime, reverse=True)
-        if log_files:
-            try:
-                with open(log_files[0], 'r') as f:
-                    lines = f.readlines()
-                    if lines:
-                        log_output(f"  Last log: {log_files[0]}")
-                        for line in lines[-15:]:
-                            log_output(f"  {line.rstrip()}")
-            except:
-                pass
-    
-    # Write full output to file
-    with open(TEST_LOG_FILE, 'w') as f:
-        f.write('\n'.join(OUTPUT_BUFFER))
-    
-    # Print only summary and failed tests to console
-    print(f"\n{Colors.YELLOW}{'='*60}")
-    print(f"Test Summary")
-    print(f"{'='*60}{Colors.RESET}\n")
-    
-    print(f"Total tests: {total_tests}")
-    print(f"Passed: {Colors.GREEN}{total_passed}{Colors.RESET}")
-    print(f"Failed: {Colors.RED}{total_tests - total_passed}{Colors.RESET}")
-    print(f"Success rate: {success_rate:.1f}%\n")
+    # Print only summary and failed tests to console, in one write
+    out = [
+        f"\n{Colors.YELLOW}{'='*60}",
+        "Test Summary",
+        f"{'='*60}{Colors.RESET}\n",
+        f"Total tests: {total_tests}",
+        f"Passed: {Colors.GREEN}{total_passed}{Colors.RESET}",
+        f"Failed: {Colors.RED}{total_tests - total_passed}{Colors.RESET}",
+        f"Success rate: {success_rate:.1f}%\n",
+    ]
     
     # Show failed tests if any
     if total_tests - total_passed > 0:
-        print(f"{Colors.RED}Failed Tests:{Colors.RESET}")
-        for failed in FAILED_TESTS:
-            print(f"  {failed}")
-        print()
+        out.append(f"{Colors.RED}Failed Tests:{Colors.RESET}")
+        out.extend(f"  ✗ {failed.name}: {failed.detail}" for failed in failed_tests)
+        out.append("")
     
     if success_rate >= 70:
-        print(f"{Colors.GREEN}{'='*60}")
-        print(f"  ✓ TESTS PASSED!")
-        print(f"  - Multi-threaded with TLS (2-16 workers): WORKING")
-        print(f"  - HTTP server: WORKING")
-        print(f"  - WebSocket server: WORKING")
-        print(f"  - Concurrent handling: WORKING")
-        print(f"  - WebSocket stress test: WORKING")
-        print(f"  - Browser simulation: WORKING")
-        print(f"  - Multiple browsers: WORKING")
-        print(f"  - Real-time log monitoring: WORKING")
-        print(f"{'='*60}{Colors.RESET}\n")
-        print(f"Full log: {TEST_LOG_FILE}\n")
-        print(f"Server log: /tmp/async-nostd.log\n")
-        return 0
+        out += [
+            f"{Colors.GREEN}{'='*60}",
+            "  ✓ TESTS PASSED!",
+            "  - Multi-threaded with TLS (2-16 workers): WORKING",
+            "  - HTTP server: WORKING",
+            "  - WebSocket server: WORKING",
+            "  - Concurrent handling: WORKING",
+            "  - WebSocket stress test: WORKING",
+            "  - Browser simulation: WORKING",
+            "  - Multiple browsers: WORKING",
+            "  - Real-time log monitoring: WORKING",
+            f"{'='*60}{Colors.RESET}\n",
+        ]
+        exit_code = 0
     else:
-        print(f"{Colors.RED}{'='*60}")
-        print(f"  ✗ SOME TESTS FAILED")
-        print(f"{'='*60}{Colors.RESET}\n")
-        print(f"Full log: {TEST_LOG_FILE}\n")
-        print(f"Server log: /tmp/async-nostd.log\n")
-        return 1
+        out += [
+            f"{Colors.RED}{'='*60}",
+            "  ✗ SOME TESTS FAILED",
+            f"{'='*60}{Colors.RESET}\n",
+        ]
+        exit_code = 1
+    out.append(f"Full log: {TEST_LOG_FILE}\n")
+    if SERIAL:
+        out.append(f"Server log: {SERVER_LOG_FILE} (last test only)\n")
+    else:
+        out.append(f"Server log: {SERVER_LOG_FILE} is overwritten by concurrent servers; "
+                   f"rerun with TEST_SERIAL=1 for a readable one\n")
+    sys.stdout.write('\n'.join(out) + '\n')
+    sys.stdout.flush()
+    return exit_code
 
 if __name__ == "__main__":
     try:
         sys.exit(main())
     except KeyboardInterrupt:
-        log_output(f"\n{Colors.YELLOW}Interrupted by user{Colors.RESET}")
-        subprocess.run(["pkill", "-9", "async-nostd"], 
-                       stderr=subprocess.DEVNULL)
+        log_output("Interrupted by user", "warn")
+        kill_live_servers()
         sys.exit(1)